@@ -41,8 +41,7 @@ def save_to_json(data_type, area_code, entries):
     Saves entries inside an object wrapper to data/{data_type}/{area_code}.json
     """
     directory = f"data/{data_type}"
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+    os.makedirs(directory, exist_ok=True)
     
     filepath = os.path.join(directory, f"{area_code}.json")
     
@@ -8,21 +8,55 @@ Features:
 - Ensures colors are distinct from other parties
 """
 
+import argparse
+import hashlib
 import json
 import os
+import platform
 import sys
-from collections import Counter
-from colorsys import hsv_to_rgb, rgb_to_hsv
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 # Configuration
 PARTY_DATA_FILE = "docs/data/party-data.json"
 PARTY_ICONS_DIR = "docs/img"
+ICON_EXTENSIONS = [".webp", ".png", ".jpg"]  # In order of preference
 OUTPUT_FILE = "docs/data/party-data.json"  # Overwrite the same file
 
-# Color similarity threshold (0-1, lower = more strict)
-# Delta E in RGB space - roughly 30-40 is visually similar
-COLOR_SIMILARITY_THRESHOLD = 35
+# Top colors per icon, keyed by icon content hash, so unchanged icons are not
+# decoded again on the next run. Bump the version when the sampling or pixel
+# filtering below changes. Kept outside docs/, which is the published site.
+COLOR_CACHE_FILE = ".color_cache.json"
+COLOR_CACHE_VERSION = 3
+
+# Color similarity threshold (lower = more strict)
+# Delta E (CIE76) in Lab space - roughly 10 is visually similar
+COLOR_SIMILARITY_THRESHOLD = 10
+
+# sRGB (linear) -> XYZ matrix and D65 reference white, for Lab conversion
+SRGB_TO_XYZ = np.array(
+    [
+        [0.4124, 0.3576, 0.1805],
+        [0.2126, 0.7152, 0.0722],
+        [0.0193, 0.1192, 0.9505],
+    ]
+)
+D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+# Pixels below this saturation (0-255, ~0.15) are ignored as gray
+MIN_PIXEL_SATURATION = 38
+
+# Icons are resized to this size before counting colors
+SAMPLE_SIZE = (50, 50)
+
+# Pixels are rounded to the nearest 10 per channel: 0, 10, ..., 260
+QUANT_LEVELS = 27
 
 
 def hex_to_rgb(hex_color):
@@ -32,31 +66,39 @@ def hex_to_rgb(hex_color):
 
 
 def rgb_to_hex(rgb):
-    """Convert RGB tuple to hex color."""
-    return f"#{int(rgb[0]):02X}{int(rgb[1]):02X}{int(rgb[2]):02X}"
+    """Convert RGB tuple to hex color (channels clamped to 0-255)."""
+    r, g, b = (min(max(int(c), 0), 255) for c in rgb)
+    return f"#{r:02X}{g:02X}{b:02X}"
 
 
-def color_distance(rgb1, rgb2):
+def rgb_to_lab(rgb):
     """
-    Calculate Euclidean distance between two RGB colors.
-    Lower value = more similar.
+    Convert sRGB color(s) in 0-255 to CIE Lab (D65).
+    Accepts a single (r, g, b) or an array of shape (..., 3).
     """
-    return sum((a - b) ** 2 for a, b in zip(rgb1, rgb2)) ** 0.5
+    c = np.asarray(rgb, dtype=float) / 255
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ SRGB_TO_XYZ.T / D65_WHITE
+
+    delta = 6 / 29
+    f = np.where(xyz > delta**3, np.cbrt(xyz), xyz / (3 * delta**2) + 4 / 29)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    return np.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=-1)
 
 
-def is_too_light_or_dark_or_gray(hex_color):
+def color_distance(rgb, other_labs):
     """
-    Check if a color is too close to white, black, or gray.
-    Returns True if the color should be excluded.
+    Calculate perceptual (Lab) distance between an RGB color and each row of
+    an (N, 3) array of Lab colors. Lower value = more similar.
     """
-    # Remove # if present
-    hex_color = hex_color.lstrip("#")
+    return np.linalg.norm(other_labs - rgb_to_lab(rgb), axis=1)
 
-    # Convert to RGB
-    r = int(hex_color[0:2], 16)
-    g = int(hex_color[2:4], 16)
-    b = int(hex_color[4:6], 16)
 
+def _invalid_rgb(r, g, b):
+    """
+    Check if a color is too close to white, black, or gray.
+    Returns True if the color should be excluded.
+    """
     # Calculate perceived brightness (human eye weights colors differently)
     # Using the formula: 0.299*R + 0.587*G + 0.114*B
     brightness = 0.299 * r + 0.587 * g + 0.114 * b
@@ -84,31 +126,84 @@ def merge_colors(rgb1, rgb2, ratio=0.5):
     )
 
 
-def is_dominant_color(color_counter, dominant_rgb):
+def is_dominant_color(top_colors, dominant_rgb):
     """
     Check if the dominant color is truly dominant (clear winner).
     Returns True if the top color has significantly more votes than the second.
+
+    top_colors: list of (rgb, count) sorted by count, most common first
     """
-    if len(color_counter) < 2:
+    if len(top_colors) < 2:
         return True  # Only one color found
 
-    top_count = color_counter[dominant_rgb]
-    second_rgb, second_count = color_counter.most_common(2)[1]
+    top_count = dict(top_colors).get(dominant_rgb, 0)
+    second_rgb, second_count = top_colors[1]
 
     # Check if dominant color has at least 30% more occurrences
     return top_count >= second_count * 1.3
 
 
-def extract_colors_from_image(image_path, existing_colors=None):
+def count_colors(img_small, limit=5):
+    """
+    Count quantized pixel colors of a small RGB image.
+    Returns up to `limit` (rgb, count) pairs sorted by count, most common first.
+    Ties keep the order in which the colors first appear in the image.
+    """
+    pixels = np.asarray(img_small, dtype=np.int16).reshape(-1, 3)
+
+    # Saturation from PIL's C-level HSV conversion (0-255 scale)
+    saturation = np.asarray(img_small.convert("HSV"))[..., 1].reshape(-1)
+
+    # Filter out colors that are too light or dark (white/black backgrounds)
+    # or too gray, in one pass
+    r, g, b = pixels[:, 0], pixels[:, 1], pixels[:, 2]
+    brightness = 0.299 * r + 0.587 * g + 0.114 * b
+    mask = (brightness >= 50) & (brightness <= 245) & (saturation > MIN_PIXEL_SATURATION)
+    filtered_pixels = pixels[mask]
+
+    # If no valid pixels found, use all pixels
+    if not len(filtered_pixels):
+        filtered_pixels = pixels
+
+    # Round RGB values to nearest 10 to group similar colors
+    # (np.rint rounds half to even, same as the builtin round())
+    levels = np.rint(filtered_pixels / 10).astype(np.int64)
+
+    # Pack each rounded color into one integer key and histogram the keys
+    keys = (levels[:, 0] * QUANT_LEVELS + levels[:, 1]) * QUANT_LEVELS + levels[:, 2]
+    counts = np.bincount(keys, minlength=QUANT_LEVELS**3)
+
+    # Rank by count, then by first appearance (unique score per color)
+    first_seen = np.full(counts.size, len(keys))
+    np.minimum.at(first_seen, keys, np.arange(len(keys)))
+    score = counts * (len(keys) + 1) - first_seen
+
+    top_keys = np.argpartition(-score, limit)[:limit]
+    top_keys = top_keys[np.argsort(-score[top_keys])]
+
+    top_colors = []
+    for key in top_keys:
+        if not counts[key]:
+            break
+        rg, b = divmod(int(key), QUANT_LEVELS)
+        r, g = divmod(rg, QUANT_LEVELS)
+        # 255 rounds up to 260, so clamp back to a real channel value
+        rgb = (min(r * 10, 255), min(g * 10, 255), min(b * 10, 255))
+        top_colors.append((rgb, int(counts[key])))
+    return top_colors
+
+
+def _extract_one(image_path):
     """
-    Extract the dominant and secondary colors from an image file.
-    Returns hex color string or None if extraction fails.
+    Decode one icon and count its colors.
+    Returns the top 5 (rgb, count) pairs, or None if extraction fails.
 
-    existing_colors: dict of {party_code: hex_color} to check for similarity
+    Runs in a worker process, so it only depends on the image itself.
     """
-    try:
-        from PIL import Image
+    if Image is None:
+        return None
 
+    try:
         img = Image.open(image_path)
 
         # Convert to RGB if necessary
@@ -116,114 +211,146 @@ def extract_colors_from_image(image_path, existing_colors=None):
             img = img.convert("RGB")
 
         # Resize to small size for faster processing
-        img_small = img.resize((50, 50), Image.Resampling.LANCZOS)
+        img_small = img.resize(SAMPLE_SIZE, Image.Resampling.LANCZOS)
 
-        # Get all pixels
-        pixels = list(img_small.getdata())
+        # Count color occurrences (with some tolerance for similar colors)
+        top_colors = count_colors(img_small)
 
-        # Filter out colors that are too light or dark (white/black backgrounds)
-        filtered_pixels = []
-        for r, g, b in pixels:
-            brightness = 0.299 * r + 0.587 * g + 0.114 * b
-            if 50 <= brightness <= 245:  # Exclude very dark and very light
-                filtered_pixels.append((r, g, b))
+        if not top_colors:
+            return None
 
-        # If no valid pixels found, use all pixels
-        if not filtered_pixels:
-            filtered_pixels = pixels
+        return top_colors
 
-        # Count color occurrences (with some tolerance for similar colors)
-        # Round RGB values to nearest 10 to group similar colors
-        rounded_pixels = []
-        for r, g, b in filtered_pixels:
-            r = round(r / 10) * 10
-            g = round(g / 10) * 10
-            b = round(b / 10) * 10
-            rounded_pixels.append((r, g, b))
+    except Exception as e:
+        print(f"Error processing {image_path}: {e}")
+        return None
 
-        color_counter = Counter(rounded_pixels)
 
-        if not color_counter:
-            return None
+def icon_digest(icon_path):
+    """Content hash of an icon file, used as the color cache key."""
+    with open(icon_path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
 
-        # Get top colors
-        top_colors = color_counter.most_common(5)
-        dominant_rgb = top_colors[0][0]
-        dominant_hex = rgb_to_hex(dominant_rgb)
-
-        # Check if dominant color is valid (not too light/dark/gray)
-        if is_too_light_or_dark_or_gray(dominant_hex):
-            # Try secondary colors
-            for rgb, _ in top_colors[1:]:
-                test_hex = rgb_to_hex(rgb)
-                if not is_too_light_or_dark_or_gray(test_hex):
-                    dominant_rgb = rgb
-                    dominant_hex = test_hex
-                    break
-            else:
-                # All top colors are invalid, try merging
-                if len(top_colors) >= 2:
-                    merged_rgb = merge_colors(top_colors[0][0], top_colors[1][0])
-                    merged_hex = rgb_to_hex(merged_rgb)
-                    if not is_too_light_or_dark_or_gray(merged_hex):
-                        dominant_rgb = merged_rgb
-                        dominant_hex = merged_hex
-                    else:
-                        return None
+
+def load_color_cache():
+    """
+    Load cached top colors as {icon_digest: top_colors}.
+    Returns an empty cache if the file is missing, unreadable or outdated.
+    """
+    try:
+        with open(COLOR_CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if cache.get("version") != COLOR_CACHE_VERSION:
+        return {}
+    return {
+        digest: [(tuple(rgb), count) for rgb, count in top_colors]
+        for digest, top_colors in cache.get("icons", {}).items()
+    }
+
+
+def save_color_cache(cache):
+    """Save {icon_digest: top_colors} to COLOR_CACHE_FILE."""
+    with open(COLOR_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"version": COLOR_CACHE_VERSION, "icons": cache}, f, separators=(",", ":"))
+
+
+def pick_party_color(top_colors, existing_labs=None):
+    """
+    Pick the dominant color from the top colors of an icon.
+    Returns (dominant_hex, simple_hex, was_merged) or None if no valid color.
+
+    simple_hex is the plain most common color; was_merged tells whether the
+    returned color was adjusted away from it (secondary color was used).
+
+    existing_labs: (N, 3) array of already assigned colors in Lab, to check for similarity
+    """
+    dominant_rgb = top_colors[0][0]
+
+    # Check if dominant color is valid (not too light/dark/gray)
+    if _invalid_rgb(*dominant_rgb):
+        # Try secondary colors
+        for rgb, _ in top_colors[1:]:
+            if not _invalid_rgb(*rgb):
+                dominant_rgb = rgb
+                break
+        else:
+            # All top colors are invalid, try merging
+            if len(top_colors) >= 2:
+                merged_rgb = merge_colors(top_colors[0][0], top_colors[1][0])
+                if not _invalid_rgb(*merged_rgb):
+                    dominant_rgb = merged_rgb
                 else:
                     return None
+            else:
+                return None
 
-        # Check if dominant color is truly dominant
-        is_clear_dominant = is_dominant_color(color_counter, dominant_rgb)
-
-        # Check for similarity with existing party colors
-        if existing_colors:
-            dominant_rgb = hex_to_rgb(dominant_hex)
-            for other_party, other_hex in existing_colors.items():
-                other_rgb = hex_to_rgb(other_hex)
-                distance = color_distance(dominant_rgb, other_rgb)
-                if distance < COLOR_SIMILARITY_THRESHOLD:
-                    # Colors are too similar - merge with secondary color to differentiate
-                    if len(top_colors) >= 2:
-                        secondary_rgb = top_colors[1][0]
-                        # Merge 60% dominant with 40% secondary
-                        new_rgb = merge_colors(dominant_rgb, secondary_rgb, 0.6)
-                        new_hex = rgb_to_hex(new_rgb)
-
-                        # Verify merged color is still valid
-                        if not is_too_light_or_dark_or_gray(new_hex):
-                            dominant_rgb = new_rgb
-                            dominant_hex = new_hex
-                    break
-
-        # If not clearly dominant, merge with secondary color for better representation
-        if not is_clear_dominant and len(top_colors) >= 2:
-            secondary_rgb = top_colors[1][0]
-            # Merge 50-50 for blended look
-            blended_rgb = merge_colors(dominant_rgb, secondary_rgb, 0.5)
-            blended_hex = rgb_to_hex(blended_rgb)
-
-            # Only use blended if it's valid
-            if not is_too_light_or_dark_or_gray(blended_hex):
-                dominant_hex = blended_hex
-
-        return dominant_hex
+    # Check if dominant color is truly dominant
+    is_clear_dominant = is_dominant_color(top_colors, dominant_rgb)
 
+    # Check for similarity with existing party colors
+    if existing_labs is not None and len(existing_labs):
+        if color_distance(dominant_rgb, existing_labs).min() < COLOR_SIMILARITY_THRESHOLD:
+            # Colors are too similar - merge with secondary color to differentiate
+            if len(top_colors) >= 2:
+                secondary_rgb = top_colors[1][0]
+                # Merge 60% dominant with 40% secondary
+                new_rgb = merge_colors(dominant_rgb, secondary_rgb, 0.6)
+
+                # Verify merged color is still valid
+                if not _invalid_rgb(*new_rgb):
+                    dominant_rgb = new_rgb
+
+    # If not clearly dominant, merge with secondary color for better representation
+    if not is_clear_dominant and len(top_colors) >= 2:
+        secondary_rgb = top_colors[1][0]
+        # Merge 50-50 for blended look
+        blended_rgb = merge_colors(dominant_rgb, secondary_rgb, 0.5)
+
+        # Only use blended if it's valid
+        if not _invalid_rgb(*blended_rgb):
+            dominant_rgb = blended_rgb
+
+    dominant_hex = rgb_to_hex(dominant_rgb)
+
+    # If extracted differs from simple dominant color, it was merged/adjusted
+    simple_hex = rgb_to_hex(top_colors[0][0])
+    was_merged = dominant_hex != simple_hex and not _invalid_rgb(*top_colors[0][0])
+
+    return dominant_hex, simple_hex, was_merged
+
+
+def pillow_simd_hint():
+    """
+    Return an install hint when stock Pillow is used on an x86 host, else None.
+    Pillow-SIMD speeds up the resize step and is versioned with a ".postN" suffix.
+    """
+    try:
+        import PIL
     except ImportError:
-        print("Warning: PIL/Pillow not installed. Install with: pip install Pillow")
-        print("Falling back to basic color extraction...")
         return None
-    except Exception as e:
-        print(f"Error processing {image_path}: {e}")
+
+    if "post" in PIL.__version__ or platform.machine() not in ("x86_64", "AMD64"):
         return None
+    return "Tip: pip install pillow-simd for SIMD-accelerated image resizing"
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Extract party colors from party icons")
+    parser.add_argument("--pretty", action="store_true", help="Indent the JSON output for humans")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("Party Color Extraction Tool v2")
     print("Features: Dominant color detection + Secondary color merge")
     print("=" * 60)
 
+    hint = pillow_simd_hint()
+    if hint:
+        print(hint)
+
     # Load existing party data
     if not os.path.exists(PARTY_DATA_FILE):
         print(f"Error: Party data file not found: {PARTY_DATA_FILE}")
@@ -241,8 +368,16 @@ def main():
     error_count = 0
     merged_count = 0
 
-    # Track colors assigned so far (for similarity checking)
-    assigned_colors = {}
+    # Track colors assigned so far (for similarity checking), one Lab row per party
+    assigned_labs = np.empty((0, 3))
+
+    # Index icon files once: {party_code: {ext: path}}
+    icons = {}
+    if os.path.isdir(PARTY_ICONS_DIR):
+        for entry in os.scandir(PARTY_ICONS_DIR):
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in ICON_EXTENSIONS:
+                icons.setdefault(stem, {})[ext.lower()] = entry.path
 
     # First pass: collect all icons and extract colors
     party_data = []
@@ -254,13 +389,9 @@ def main():
         if not party_code:
             continue
 
-        # Look for the icon file
-        icon_path = None
-        for ext in [".webp", ".png", ".jpg"]:
-            test_path = os.path.join(PARTY_ICONS_DIR, f"{party_code}{ext}")
-            if os.path.exists(test_path):
-                icon_path = test_path
-                break
+        # Look for the icon file, in extension priority order
+        paths = icons.get(party_code, {})
+        icon_path = next((paths[ext] for ext in ICON_EXTENSIONS if ext in paths), None)
 
         party_data.append(
             {
@@ -272,6 +403,29 @@ def main():
             }
         )
 
+    # Reuse cached colors for icons whose content has not changed
+    icon_paths = [pd["icon_path"] for pd in party_data if pd["icon_path"]]
+    digests = {path: icon_digest(path) for path in icon_paths}
+    cache = load_color_cache()
+    new_paths = [path for path in icon_paths if digests[path] not in cache]
+
+    if new_paths and Image is None:
+        print("Warning: PIL/Pillow not installed. Install with: pip install Pillow")
+        print("Only icons with cached colors can be processed")
+
+    # Decode the remaining icons in parallel - only the color assignment below
+    # depends on previously assigned colors
+    with ProcessPoolExecutor() as executor:
+        for path, top_colors in zip(new_paths, executor.map(_extract_one, new_paths)):
+            if top_colors:
+                cache[digests[path]] = top_colors
+
+    print(f"Decoded {len(new_paths)} icons ({len(icon_paths) - len(new_paths)} cached)")
+    top_colors_by_path = {path: cache.get(digests[path]) for path in icon_paths}
+
+    # Only keep entries for the current icons
+    save_color_cache({digests[path]: top for path, top in top_colors_by_path.items() if top})
+
     # Process in order (to maintain consistency)
     for pd in party_data:
         party_code = pd["code"]
@@ -285,65 +439,24 @@ def main():
             skipped_count += 1
             # Keep old color if exists, otherwise skip
             if old_color != "N/A":
-                assigned_colors[party_code] = old_color
+                assigned_labs = np.vstack([assigned_labs, rgb_to_lab(hex_to_rgb(old_color))])
             continue
 
-        # Extract color with similarity check against already assigned colors
-        extracted_color = extract_colors_from_image(icon_path, assigned_colors)
+        # Pick color with similarity check against already assigned colors
+        result = None
+        if top_colors_by_path[icon_path]:
+            result = pick_party_color(top_colors_by_path[icon_path], assigned_labs)
 
-        if extracted_color:
+        if result:
+            extracted_color, _, was_merged = result
             party_ref["colorPrimary"] = extracted_color
-            assigned_colors[party_code] = extracted_color
-
-            # Check if this was a merge operation
-            if len(extract_colors_from_image.__code__.co_varnames) > 0:
-                pass  # Internal tracking
+            assigned_labs = np.vstack([assigned_labs, rgb_to_lab(hex_to_rgb(extracted_color))])
 
             status_symbol = "✓"
             note = ""
-
-            # Detect if color is likely a merge (secondary was used)
-            # by checking if it differs from simple dominant extraction
-            from PIL import Image
-
-            try:
-                img = Image.open(icon_path)
-                if img.mode != "RGB":
-                    img = img.convert("RGB")
-                img_small = img.resize((50, 50), Image.Resampling.LANCZOS)
-                pixels = list(img_small.getdata())
-
-                filtered_pixels = []
-                for r, g, b in pixels:
-                    brightness = 0.299 * r + 0.587 * g + 0.114 * b
-                    if 50 <= brightness <= 245:
-                        filtered_pixels.append((r, g, b))
-
-                if not filtered_pixels:
-                    filtered_pixels = pixels
-
-                rounded_pixels = []
-                for r, g, b in filtered_pixels:
-                    r = round(r / 10) * 10
-                    g = round(g / 10) * 10
-                    b = round(b / 10) * 10
-                    rounded_pixels.append((r, g, b))
-
-                color_counter = Counter(rounded_pixels)
-
-                # Simple dominant extraction
-                if color_counter:
-                    simple_rgb = color_counter.most_common(1)[0][0]
-                    simple_hex = rgb_to_hex(simple_rgb)
-
-                    # If extracted differs from simple, it was merged/adjusted
-                    if extracted_color != simple_hex and not is_too_light_or_dark_or_gray(
-                        simple_hex
-                    ):
-                        note = " (merged)"
-                        merged_count += 1
-            except:
-                pass
+            if was_merged:
+                note = " (merged)"
+                merged_count += 1
 
             print(
                 f"  {status_symbol} {party_code} ({party_name}): {old_color} → {extracted_color}{note}"
@@ -354,7 +467,7 @@ def main():
             error_count += 1
             # Keep old color if exists
             if old_color != "N/A":
-                assigned_colors[party_code] = old_color
+                assigned_labs = np.vstack([assigned_labs, rgb_to_lab(hex_to_rgb(old_color))])
 
     # Save updated data
     print(f"\n{'=' * 60}")
@@ -366,8 +479,11 @@ def main():
     print(f"{'=' * 60}")
 
     # Save to file
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with open(OUTPUT_FILE, "w", encoding="utf-8", buffering=1 << 20) as f:
+        if args.pretty:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        else:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
 
     print(f"\n✅ Updated party data saved to: {OUTPUT_FILE}")
     print("\nYou can now commit this change and merge it to master.")
@@ -1,6 +1,13 @@
 import os
 import json
-from collections import defaultdict
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson  # Optional: much faster JSON parsing and writing
+except ImportError:
+    orjson = None
 
 # Configuration
 MP_DIR = "data/mp"
@@ -23,6 +30,31 @@ def load_province_map():
         print(f"Warning: Could not load common data: {e}")
         return {}
 
+def load_json(path):
+    """
+    Reads a JSON file, using orjson when it is installed.
+    """
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def dump_json(data, path, pretty=False):
+    """
+    Writes data as UTF-8 JSON, compact unless pretty, using orjson when it is installed.
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=option))
+        return
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        if pretty:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        else:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
 def get_province_info(area_code, province_map):
     prefix = area_code[:2]
     return prefix, province_map.get(prefix, f"Unknown ({prefix})")
@@ -34,25 +66,113 @@ def get_candidate_number_str(candidate_code, area_code):
     prefix = f"CANDIDATE-MP-{area_code}"
     if candidate_code and candidate_code.startswith(prefix):
         raw_num = candidate_code[len(prefix):]
-        try:
-            return str(int(raw_num))
-        except ValueError:
+        if not (raw_num.isascii() and raw_num.isdigit()):
             return None
+        # Canonical form without leading zeros, e.g. '05' -> '5'
+        return raw_num.lstrip("0") or "0"
     return None
 
+def scan_area(filename):
     """
-    Extracts candidate number string from code, e.g., 'CANDIDATE-MP-100105' -> '5'
+    Checks one area for the Twin Number anomaly.
+    Returns the anomaly record, or None if the area is not flagged.
+    Runs in a worker process, so it only reads the area's own files.
     """
-    prefix = f"CANDIDATE-MP-{area_code}"
-    if candidate_code and candidate_code.startswith(prefix):
-        raw_num = candidate_code[len(prefix):]
-        try:
-            return str(int(raw_num))
-        except ValueError:
-            return None
+    area_code = filename.replace(".json", "")
+    mp_path = os.path.join(MP_DIR, filename)
+    pl_path = os.path.join(PL_DIR, filename)
+
+    if not os.path.exists(pl_path):
+        return None
+
+    try:
+        mp_data = load_json(mp_path)
+        pl_data = load_json(pl_path)
+    except Exception as e:
+        print(f"Error reading {area_code}: {e}")
+        return None
+
+    mp_entries = mp_data.get("entries", [])
+    pl_entries = pl_data.get("entries", [])
+    
+    if not mp_entries:
+        return None
+
+    # 1. Identify Winner
+    winner = mp_entries[0]
+    winner_num_str = get_candidate_number_str(winner.get("candidateCode"), area_code)
+    
+    if not winner_num_str:
+        return None
+        
+    # 2. Extract Winner Stats
+    winner_party_code = winner.get("partyCode", "")
+    winner_votes = winner.get("voteTotal", 0)
+    
+    # 3. Check "Twin Party" in Party List
+    # Construct the target party ID: e.g. winner #5 -> "PARTY-0005"
+    target_party_id = f"PARTY-{int(winner_num_str):04d}"
+        
+    # Index entries by party code (first entry wins, like a linear scan would)
+    pl_by_party = {e.get("partyCode"): e for e in reversed(pl_entries)}
+    mp_by_party = {e.get("partyCode"): e for e in reversed(mp_entries)}
+
+    # Find this party in the PL results
+    pl_twin_entry = pl_by_party.get(target_party_id)
+    
+    # New: Find MP Candidate for this Twin Party in the same area
+    mp_twin_entry = mp_by_party.get(target_party_id)
+    mp_twin_votes = mp_twin_entry.get("voteTotal", 0) if mp_twin_entry else 0
+    
+    if pl_twin_entry:
+        pl_votes = pl_twin_entry.get("voteTotal", 0)
+        pl_rank = pl_twin_entry.get("rank")
+        
+        # 4. Calculate Ratio (Twin PL Votes / Winner MP Votes)
+        # Note: This is a localized ratio (Area specific), different from the global ratio in verify_hypothesis.py
+        # But the 'Anomaly' is defined by the Twin Effect mainly.
+        
+        # Avoid division by zero
+        base_votes = winner_votes if winner_votes > 0 else 1
+        ratio = pl_votes / base_votes
+        
+        # 5. Filter for Reporting
+        # Condition A: Winner number is 1-9 (excluding 6, 9)
+        # Condition B: The Twin Party ranks high (Top 7) OR The Twin Party gets significant votes
+        
+        is_single_digit = winner_num_str in SINGLE_DIGIT_RANGE
+        is_excluded = winner_num_str in EXCLUDED_PARTIES
+        
+        if is_single_digit and not is_excluded:
+            # Calculate simple anomaly score:
+            # How much did the "Twin Party" overperform expectations?
+            # Expectation: Twin Party (often small) shouldn't be in Top 7 ifMP Winner is from a different party.
+            
+            # Check if MP Winner Party is DIFFERENT from Twin Party
+            # (Almost always true, as Party-0005 is likely not the party of Candidate #5)
+            is_different_party = winner_party_code != target_party_id
+            
+            if is_different_party and pl_rank <= 7:
+                return {
+                    "area_code": area_code,
+                    "mp_winner_number": winner_num_str,
+                    "mp_winner_party": winner_party_code,
+                    "mp_votes": winner_votes,
+                    "pl_twin_party": target_party_id,
+                    "pl_twin_rank": pl_rank,
+                    "pl_twin_votes": pl_votes,
+                    "mp_twin_candidate_votes": mp_twin_votes,
+                    "ratio_pl_to_mp": round(ratio, 4), # Ratio of Twin PL votes to Winner MP votes
+                    "anomaly_score": pl_votes, # Simple score: raw votes obtained by the twin party
+                    "province_id": area_code[:2]
+                }
     return None
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate the Twin Number anomaly report")
+    parser.add_argument("--pretty", action="store_true", help="Indent the JSON report for humans")
+    args = parser.parse_args()
+
     print(f"Scanning data from {MP_DIR} and {PL_DIR}...")
     
     province_map = load_province_map()
@@ -61,100 +181,17 @@ def main():
         print(f"Error: Directory {MP_DIR} not found.")
         return
 
-    mp_files = sorted([f for f in os.listdir(MP_DIR) if f.endswith(".json")])
+    # Sorted so that ties in the final ranking keep a stable area order
+    mp_files = sorted(
+        e.name for e in os.scandir(MP_DIR) if e.is_file() and e.name.endswith(".json")
+    )
     anomalies = []
     
-    for filename in mp_files:
-        area_code = filename.replace(".json", "")
-        mp_path = os.path.join(MP_DIR, filename)
-        pl_path = os.path.join(PL_DIR, filename)
-
-        if not os.path.exists(pl_path):
-            continue
-
-        try:
-            with open(mp_path, "r", encoding="utf-8") as f:
-                mp_data = json.load(f)
-            with open(pl_path, "r", encoding="utf-8") as f:
-                pl_data = json.load(f)
-        except Exception as e:
-            print(f"Error reading {area_code}: {e}")
-            continue
-
-        mp_entries = mp_data.get("entries", [])
-        pl_entries = pl_data.get("entries", [])
-        
-        if not mp_entries:
-            continue
-
-        # 1. Identify Winner
-        winner = mp_entries[0]
-        winner_num_str = get_candidate_number_str(winner.get("candidateCode"), area_code)
-        
-        if not winner_num_str:
-            continue
-            
-        # 2. Extract Winner Stats
-        winner_party_code = winner.get("partyCode", "")
-        winner_votes = winner.get("voteTotal", 0)
-        
-        # 3. Check "Twin Party" in Party List
-        # Construct the target party ID: e.g. winner #5 -> "PARTY-0005"
-        try:
-            target_party_id = f"PARTY-{int(winner_num_str):04d}"
-        except ValueError:
-            continue
-            
-        # Find this party in the PL results
-        pl_twin_entry = next((e for e in pl_entries if e.get("partyCode") == target_party_id), None)
-        
-        # New: Find MP Candidate for this Twin Party in the same area
-        mp_twin_entry = next((e for e in mp_entries if e.get("partyCode") == target_party_id), None)
-        mp_twin_votes = mp_twin_entry.get("voteTotal", 0) if mp_twin_entry else 0
-        
-        if pl_twin_entry:
-            pl_votes = pl_twin_entry.get("voteTotal", 0)
-            pl_rank = pl_twin_entry.get("rank")
-            
-            # 4. Calculate Ratio (Twin PL Votes / Winner MP Votes)
-            # Note: This is a localized ratio (Area specific), different from the global ratio in verify_hypothesis.py
-            # But the 'Anomaly' is defined by the Twin Effect mainly.
-            
-            # Avoid division by zero
-            base_votes = winner_votes if winner_votes > 0 else 1
-            ratio = pl_votes / base_votes
-            
-            # 5. Filter for Reporting
-            # Condition A: Winner number is 1-9 (excluding 6, 9)
-            # Condition B: The Twin Party ranks high (Top 7) OR The Twin Party gets significant votes
-            
-            is_single_digit = winner_num_str in SINGLE_DIGIT_RANGE
-            is_excluded = winner_num_str in EXCLUDED_PARTIES
-            
-            if is_single_digit and not is_excluded:
-                # Calculate simple anomaly score:
-                # How much did the "Twin Party" overperform expectations?
-                # Expectation: Twin Party (often small) shouldn't be in Top 7 ifMP Winner is from a different party.
-                
-                # Check if MP Winner Party is DIFFERENT from Twin Party
-                # (Almost always true, as Party-0005 is likely not the party of Candidate #5)
-                is_different_party = winner_party_code != target_party_id
-                
-                if is_different_party and pl_rank <= 7:
-                    anomalies.append({
-                        "area_code": area_code,
-                        "mp_winner_number": winner_num_str,
-                        "mp_winner_party": winner_party_code,
-                        "mp_votes": winner_votes,
-                        "pl_twin_party": target_party_id,
-                        "pl_twin_rank": pl_rank,
-                        "pl_twin_votes": pl_votes,
-                        "mp_twin_candidate_votes": mp_twin_votes,
-                        "ratio_pl_to_mp": round(ratio, 4), # Ratio of Twin PL votes to Winner MP votes
-                        "anomaly_score": pl_votes, # Simple score: raw votes obtained by the twin party
-                        "province_id": area_code[:2],
-                        "province_name": province_map.get(area_code[:2], "Unknown")
-                    })
+    with ProcessPoolExecutor() as executor:
+        for anomaly in executor.map(scan_area, mp_files, chunksize=16):
+            if anomaly:
+                anomaly["province_name"] = province_map.get(anomaly["province_id"], "Unknown")
+                anomalies.append(anomaly)
 
     # Sort by 'anomaly_score' (votes obtained by the questionable party) descending
     anomalies.sort(key=lambda x: x["anomaly_score"], reverse=True)
@@ -162,53 +199,64 @@ def main():
     # --- Aggregations ---
     
     # 1. By Province
-    province_stats = defaultdict(lambda: {"count": 0, "total_ghost_votes": 0, "areas": []})
+    province_count = Counter()
+    province_votes = Counter()
+    province_names = {}
+    province_areas = defaultdict(list)
     for a in anomalies:
         p_id = a["province_id"]
-        p_name = a["province_name"]
-        entry = province_stats[p_id]
-        entry["id"] = p_id
-        entry["name"] = p_name
-        entry["count"] += 1
-        entry["total_ghost_votes"] += a["pl_twin_votes"]
-        entry["areas"].append({
+        province_count[p_id] += 1
+        province_votes[p_id] += a["pl_twin_votes"]
+        province_names[p_id] = a["province_name"]
+        province_areas[p_id].append({
             "area_code": a["area_code"],
             "ghost_votes": a["pl_twin_votes"],
             "mp_winner_party": a["mp_winner_party"],
             "mp_number": a["mp_winner_number"]
         })
         
-    # Sort areas inside each province by ghost votes
-    for p in province_stats.values():
-        p["areas"].sort(key=lambda x: x["ghost_votes"], reverse=True)
+    sorted_provinces = []
+    for p_id, count in province_count.items():
+        # Sort areas inside each province by ghost votes
+        areas = sorted(province_areas[p_id], key=lambda x: x["ghost_votes"], reverse=True)
+        sorted_provinces.append({
+            "count": count,
+            "total_ghost_votes": province_votes[p_id],
+            "areas": areas,
+            "id": p_id,
+            "name": province_names[p_id]
+        })
 
-    sorted_provinces = sorted(province_stats.values(), key=lambda x: x["total_ghost_votes"], reverse=True)
+    sorted_provinces.sort(key=lambda x: x["total_ghost_votes"], reverse=True)
 
     # 2. By Winning MP Party
-    mp_party_stats = defaultdict(lambda: {"count": 0, "total_ghost_votes": 0, "provinces": defaultdict(lambda: {"count": 0, "votes": 0})})
+    mp_party_count = Counter()
+    mp_party_votes = Counter()
+    mp_party_province_count = defaultdict(Counter)
+    mp_party_province_votes = defaultdict(Counter)
     for a in anomalies:
         party = a["mp_winner_party"]
         p_name = a["province_name"]
-        entry = mp_party_stats[party]
-        entry["party_code"] = party
-        entry["count"] += 1
-        entry["total_ghost_votes"] += a["pl_twin_votes"]
-        
-        prov_entry = entry["provinces"][p_name]
-        prov_entry["count"] += 1
-        prov_entry["votes"] += a["pl_twin_votes"]
+        mp_party_count[party] += 1
+        mp_party_votes[party] += a["pl_twin_votes"]
+        mp_party_province_count[party][p_name] += 1
+        mp_party_province_votes[party][p_name] += a["pl_twin_votes"]
         
-    # Convert defaultdict to list and sort inner provinces
+    # Build the party list and sort inner provinces
     sorted_mp_parties = []
-    for party_code, data in mp_party_stats.items():
-        # Convert provinces dict to sorted list
-        prov_list = [{"name": name, "count": d["count"], "votes": d["votes"]} for name, d in data["provinces"].items()]
+    for party_code, count in mp_party_count.items():
+        # Convert provinces counters to sorted list
+        province_votes_for_party = mp_party_province_votes[party_code]
+        prov_list = [
+            {"name": name, "count": c, "votes": province_votes_for_party[name]}
+            for name, c in mp_party_province_count[party_code].items()
+        ]
         prov_list.sort(key=lambda x: x["votes"], reverse=True)
         
         sorted_mp_parties.append({
             "party_code": party_code,
-            "count": data["count"],
-            "total_ghost_votes": data["total_ghost_votes"],
+            "count": count,
+            "total_ghost_votes": mp_party_votes[party_code],
             "provinces": prov_list
         })
         
@@ -226,8 +274,8 @@ def main():
         "mp_party_stats": sorted_mp_parties
     }
     
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+    # Machine-consumed by the site, so write it compact unless --pretty is given
+    dump_json(output_data, OUTPUT_FILE, pretty=args.pretty)
         
     print(f"\nAnalysis complete. Found {len(anomalies)} anomalies.")
     print(f"Report saved to: {(OUTPUT_FILE)}")